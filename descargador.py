@@ -1,13 +1,22 @@
 #!/usr/bin/python3
 
-from os import path, mkdir, getcwd, chdir, getenv
+import os
+import re
+
+from os import path, makedirs, getcwd, getenv
 from sys import exit, stdout, stderr
-from typing import Dict, List, Optional
-from requests import get, post
-from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Pattern, Tuple
+from requests import Session
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from urllib3.exceptions import HTTPError as Urllib3Error
+from urllib3.response import HTTPResponse
+from urllib3.util.retry import Retry
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from platform import system
-from hashlib import sha256
+from hashlib import md5, sha256
 from shutil import move
+from threading import Lock
 from time import perf_counter
 
 from PyQt6.QtWidgets import (QApplication, QVBoxLayout, QHBoxLayout, QWidget, 
@@ -15,6 +24,19 @@ from PyQt6.QtWidgets import (QApplication, QVBoxLayout, QHBoxLayout, QWidget,
 from PyQt6.QtCore import Qt, QThread, pyqtSignal
 
 NEW_LINE: str = "\n" if system() != "Windows" else "\r\n"
+URL_PATTERN: Pattern = re.compile(r"/d/([A-Za-z0-9]+)/?(?:[?#]|$)")
+MIN_SEGMENT_SIZE: int = 8 * 1024 * 1024
+SEGMENT_COUNT: int = 4
+SEGMENT_ATTEMPTS: int = 3
+UPDATE_INTERVAL: float = 0.1
+RATE_UNITS: Tuple[Tuple[int, str], ...] = ((1024 ** 3, "GB/s"), (1024 ** 2, "MB/s"), (1024, "KB/s"), (1, "B/s"))
+USER_AGENT: str = getenv("GF_USERAGENT") or "Mozilla/5.0"
+BASE_HEADERS: Dict[str, str] = {
+    "User-Agent": USER_AGENT,
+    "Accept-Encoding": "gzip, deflate, br",
+    "Accept": "*/*",
+    "Connection": "keep-alive",
+}
 
 
 def die(_str: str) -> None:
@@ -28,86 +50,113 @@ def _print(_str: str) -> None:
     stdout.flush()
 
 
+def format_status(filename: str, progress: float, rate: float) -> str:
+    if progress >= 100:
+        return f"\rDownloading {filename}: Done!" + NEW_LINE
+
+    scale, unit = next((rate_unit for rate_unit in RATE_UNITS if rate >= rate_unit[0]), RATE_UNITS[-1])
+
+    return f"\rDownloading {filename}: {round(progress, 1)}% at {round(rate / scale, 1)} {unit}"
+
+
+def make_session(max_workers: int) -> Session:
+    session: Session = Session()
+    # Segmented downloads can keep SEGMENT_COUNT connections open per file.
+    session.mount("https://", HTTPAdapter(pool_connections=max_workers,
+                                          pool_maxsize=max_workers * SEGMENT_COUNT,
+                                          max_retries=Retry(total=3, backoff_factor=0.3,
+                                                            status_forcelist=(429, 503),
+                                                            raise_on_status=False)))
+    session.headers.update(BASE_HEADERS)
+
+    return session
+
+
 class DownloadThread(QThread):
-    progress_signal = pyqtSignal(int)
+    update_signal = pyqtSignal(str, float, float)
     message_signal = pyqtSignal(str)
 
-    def __init__(self, url: str, password: Optional[str], max_workers: int) -> None:
+    def __init__(self, url: str, password: Optional[str], max_workers: int, get_token: Callable[[], str],
+                 session: Session) -> None:
         super().__init__()
         self.url = url
         self.password = password
         self.max_workers = max_workers
+        self.get_token = get_token
+        self.session = session
 
     def run(self) -> None:
-        main = Main(self.url, self.password, self.max_workers, self.progress_signal, self.message_signal)
+        try:
+            token: str = self.get_token()
+        except RequestException as error:
+            self.message_signal.emit(f"Couldn't get an account token: {error}")
+            return
+
+        main = Main(self.url, self.password, self.max_workers, token, self.session,
+                    self.update_signal, self.message_signal)
         main.start_downloads()
 
 
 class Main:
-    def __init__(self, url: str, password: Optional[str], max_workers: int,
-                 progress_signal: pyqtSignal, message_signal: pyqtSignal) -> None:
-        try:
-            if not url.split("/")[-2] == "d":
-                die(f"The url probably doesn't have an id in it: {url}")
+    def __init__(self, url: str, password: Optional[str], max_workers: int, token: str, session: Session,
+                 update_signal: pyqtSignal, message_signal: pyqtSignal) -> None:
+        match = URL_PATTERN.search(url)
+
+        if not match:
+            die(f"The url probably doesn't have an id in it: {url}")
 
-            self._id: str = url.split("/")[-1]
-        except IndexError:
-            die(f"Something is wrong with the url: {url}.")
+        self._id: str = match.group(1)
 
         self._downloaddir: Optional[str] = getenv("GF_DOWNLOADDIR")
 
+        download_dir: str = getcwd()
+
         if self._downloaddir and path.exists(self._downloaddir):
-            chdir(self._downloaddir)
+            download_dir = path.abspath(self._downloaddir)
 
-        self._root_dir: str = path.join(getcwd(), self._id)
-        self._token: str = self._getToken()
-        self._password: Optional[str] = sha256(password.encode()).hexdigest() if password else None
+        self._root_dir: str = path.join(download_dir, self._id)
         self._max_workers: int = max_workers
+        self._session: Session = session
+        self._token: str = token
+        self._password: Optional[str] = sha256(password.encode(), usedforsecurity=False).hexdigest() if password else None
 
         self._files_link_list: List[Dict] = []
-        self.progress_signal = progress_signal
+        self.update_signal = update_signal
         self.message_signal = message_signal
 
-        self._createDir(self._id)
-        chdir(self._id)
-        self._parseLinks(self._id, self._token, self._password)
+        self._createDir(self._root_dir)
+        self._parseLinks(self._id, self._token, self._root_dir, self._password)
 
     def start_downloads(self) -> None:
         self._threadedDownloads()
 
     def _threadedDownloads(self) -> None:
-        chdir(self._root_dir)
-
         with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
-            for item in self._files_link_list:
-                executor.submit(self._downloadContent, item, self._token, 16384)
+            futures: Dict[Future, Dict] = {
+                executor.submit(self._downloadContent, item, self._token, 1024 * 1024): item
+                for item in self._files_link_list
+            }
 
-    def _createDir(self, dirname: str) -> None:
-        current_dir: str = getcwd()
-        filepath: str = path.join(current_dir, dirname)
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as error:
+                    self.message_signal.emit(f"Couldn't download {futures[future]['filename']}: {error}" + NEW_LINE)
 
-        try:
-            mkdir(filepath)
-        except FileExistsError:
-            pass
+    def _createDir(self, dirpath: str) -> None:
+        makedirs(dirpath, exist_ok=True)
 
     @staticmethod
-    def _getToken() -> str:
-        headers: Dict = {
-            "User-Agent": getenv("GF_USERAGENT") if getenv("GF_USERAGENT") else "Mozilla/5.0",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept": "*/*",
-            "Connection": "keep-alive",
-        }
-
-        create_account_response: Dict = post("https://api.gofile.io/accounts", headers=headers).json()
+    def _getToken(session: Session) -> str:
+        create_account_response: Dict = session.post("https://api.gofile.io/accounts", timeout=(9, 27)).json()
 
         if create_account_response["status"] != "ok":
-            die("Account creation failed!")
+            raise RequestException("Account creation failed!")
 
         return create_account_response["data"]["token"]
 
-    def _downloadContent(self, file_info: Dict, token: str, chunk_size: int = 4096) -> None:
+    def _downloadContent(self, file_info: Dict, token: str, chunk_size: int = 4096, retry: bool = True,
+                         segmented: bool = True) -> None:
         if path.exists(file_info["path"]):
             if path.getsize(file_info["path"]) > 0:
                 self.message_signal.emit(f"{file_info['filename']} already exists, skipping.")
@@ -118,12 +167,9 @@ class Main:
 
         headers: Dict = {
             "Cookie": "accountToken=" + token,
-            "Accept-Encoding": "gzip, deflate, br",
-            "User-Agent": getenv("GF_USERAGENT") if getenv("GF_USERAGENT") else "Mozilla/5.0",
-            "Accept": "*/*",
+            "Accept-Encoding": "identity",
             "Referer": url + ("/" if not url.endswith("/") else ""),
             "Origin": url,
-            "Connection": "keep-alive",
             "Sec-Fetch-Dest": "empty",
             "Sec-Fetch-Mode": "cors",
             "Sec-Fetch-Site": "same-site",
@@ -131,6 +177,13 @@ class Main:
             "Cache-Control": "no-cache"
         }
 
+        state_file: str = filename + '.segments'
+        if segmented and path.isfile(state_file):
+            # An interrupted segmented download, pick up each range where it stopped.
+            if not self._segmentedDownload(file_info, headers, chunk_size) and retry and not path.isfile(state_file):
+                self._downloadContent(file_info, token, chunk_size, retry=False, segmented=False)
+            return
+
         part_size: int = 0
         if path.isfile(filename):
             part_size = int(path.getsize(filename))
@@ -138,9 +191,19 @@ class Main:
 
         has_size: Optional[str] = None
         message: str = " "
+        digest: Any = None
+        verified: bool = True
 
         try:
-            with get(url, headers=headers, stream=True, timeout=(9, 27)) as response_handler:
+            with self._session.get(url, headers=headers, stream=True, timeout=(9, 27)) as response_handler:
+                if part_size > 0 and response_handler.status_code == 416:
+                    # The .part already covers the whole file, a download that finished without
+                    # being renamed (segmented ones keep their progress in the .segments file).
+                    # Its size alone can't tell if it's the right file, start over.
+                    response_handler.close()
+                    os.remove(filename)
+                    return self._downloadContent(file_info, token, chunk_size, retry, segmented)
+
                 if ((response_handler.status_code in (403, 404, 405, 500)) or
                     (part_size == 0 and response_handler.status_code != 200) or
                     (part_size > 0 and response_handler.status_code != 206)):
@@ -165,89 +228,312 @@ class Main:
                     )
                     return
 
+                total_size: int = int(has_size)
+                # identity is only asked for, a server can still send the body compressed.
+                encoding: str = response_handler.headers.get("Content-Encoding", "identity")
+                encoded: bool = encoding != "identity"
+
+                if encoded and any(name.strip() not in HTTPResponse.CONTENT_DECODERS for name in encoding.split(",")):
+                    self.message_signal.emit(
+                        f"Couldn't decode the file from {url}."
+                        + NEW_LINE
+                        + f"Content-Encoding: {encoding}"
+                        + NEW_LINE
+                    )
+                    return
+
+                if encoded and part_size > 0:
+                    # The range is of the encoded body, it doesn't line up with the decoded .part.
+                    response_handler.close()
+                    os.remove(filename)
+                    return self._downloadContent(file_info, token, chunk_size, retry, segmented)
+
+                segments: int = min(SEGMENT_COUNT, total_size // MIN_SEGMENT_SIZE)
+
+                # A failed segmented attempt that got nothing (e.g. ranges answered with a
+                # plain 200) is retried as a single stream.
+                if (segmented and not encoded and part_size == 0 and segments > 1 and hasattr(os, "pwrite")
+                        and response_handler.headers.get("Accept-Ranges") == "bytes"):
+                    response_handler.close()
+                    # The segmented path finishes or keeps its own preallocated .part, whose size
+                    # says nothing about what was received, so the size check below must skip it.
+                    has_size = None
+                    if (not self._segmentedDownload(file_info, headers, chunk_size, total_size, segments)
+                            and retry and not path.isfile(state_file)):
+                        self._downloadContent(file_info, token, chunk_size, retry=False, segmented=False)
+                    return
+
+                if encoded:
+                    # Content-Length counts the encoded bytes, the size is only known once
+                    # the decoded stream ends cleanly.
+                    has_size = None
+
+                if file_info["md5"]:
+                    digest = self._md5File(filename, part_size)
+
+                # Not preallocated: the size of the .part is what the next attempt resumes
+                # from, so it must only ever cover bytes that were actually written.
                 with open(filename, 'ab') as handler:
-                    total_size: float = float(has_size)
+                    name: str = file_info["filename"]
+                    bytes_done: int = part_size
 
                     start_time: float = perf_counter()
-                    for i, chunk in enumerate(response_handler.iter_content(chunk_size=chunk_size)):
-                        progress: float = (part_size + (i * len(chunk))) / total_size * 100
+                    last_update: float = 0.0
+                    # The body comes over TLS and has to be decrypted in userspace, so it
+                    # can't be spliced from the socket to the file without passing through here.
+                    chunks: Iterator[bytes] = response_handler.iter_content(chunk_size) if encoded \
+                        else iter(lambda: response_handler.raw.read(chunk_size, decode_content=False), b"")
+
+                    for chunk in chunks:
                         handler.write(chunk)
+                        bytes_done += len(chunk)
+                        if digest is not None:
+                            digest.update(chunk)
+
+                        now: float = perf_counter()
+                        if now - last_update >= UPDATE_INTERVAL:
+                            # Capped below 100, only _finishDownload reports a file as done.
+                            self.update_signal.emit(name, min(bytes_done * 100 / total_size, 99.9),
+                                                    (bytes_done - part_size) / (now - start_time))
+                            last_update = now
 
-                        rate: float = (i * len(chunk)) / (perf_counter()-start_time)
-                        unit: str = "B/s"
-                        if rate < (1024):
-                            unit = "B/s"
-                        elif rate < (1024*1024):
-                            rate /= 1024
-                            unit = "KB/s"
-                        elif rate < (1024*1024*1024):
-                            rate /= (1024 * 1024)
-                            unit = "MB/s"
-                        elif rate < (1024*1024*1024*1024):
-                            rate /= (1024 * 1024 * 1024)
-                            unit = "GB/s"
-
-                        self.progress_signal.emit(int(progress))
-                        self.message_signal.emit(f"\rDownloading {file_info['filename']}: {round(progress, 1)}% at {round(rate, 1)} {unit}")
+                if encoded:
+                    has_size = str(bytes_done)
 
         finally:
-            if path.getsize(filename) == int(has_size):
-                move(filename, file_info["path"])
-                self.message_signal.emit(f"\rDownloading {file_info['filename']}: Done!" + NEW_LINE)
+            if has_size and path.isfile(filename) and path.getsize(filename) == int(has_size):
+                verified = self._finishDownload(file_info, digest.hexdigest() if digest is not None else None)
+
+        if not verified and retry:
+            self._downloadContent(file_info, token, chunk_size, retry=False, segmented=False)
+
+    def _segmentedDownload(self, file_info: Dict, headers: Dict, chunk_size: int,
+                           total_size: int = 0, segments: int = 0) -> bool:
+        filename: str = file_info["path"] + '.part'
+        state_file: str = filename + '.segments'
+        resuming: bool = path.isfile(state_file)
 
-    def _cacheLink(self, filepath: str, filename: str, link: str) -> None:
+        if resuming:
+            total_size, bounds, received = self._loadSegments(state_file)
+
+            if not path.isfile(filename) or path.getsize(filename) != total_size:
+                # The .part these ranges were written to is gone or was replaced, start them over.
+                resuming = False
+                received = [0] * len(bounds)
+                self._saveSegments(state_file, total_size, bounds, received)
+        else:
+            bounds = [(i * total_size // segments, (i + 1) * total_size // segments - 1) for i in range(segments)]
+            received = [0] * segments
+            self._saveSegments(state_file, total_size, bounds, received)
+
+        fd: int = os.open(filename, os.O_WRONLY | os.O_CREAT, 0o644)
+
+        try:
+            if not resuming:
+                os.ftruncate(fd, total_size)
+                self._preallocate(fd, 0, total_size)
+
+            resumed: int = sum(received)
+            start_time: float = perf_counter()
+
+            with ThreadPoolExecutor(max_workers=len(bounds)) as executor:
+                for _ in range(SEGMENT_ATTEMPTS):
+                    futures: List[Future] = [
+                        executor.submit(self._downloadSegment, file_info["link"], headers, fd,
+                                        bounds, received, index, chunk_size)
+                        for index, (start, end) in enumerate(bounds) if received[index] < end - start + 1
+                    ]
+
+                    pending = futures
+                    while pending:
+                        _, pending = wait(pending, timeout=UPDATE_INTERVAL)
+                        done: int = sum(received)
+                        self._saveSegments(state_file, total_size, bounds, received)
+                        self.update_signal.emit(file_info["filename"], min(done * 100 / total_size, 99.9),
+                                                (done - resumed) / (perf_counter()-start_time))
+
+                    if all(future.result() for future in futures):
+                        break
+        finally:
+            os.close(fd)
+            self._saveSegments(state_file, total_size, bounds, received)
+
+        if sum(received) < total_size:
+            if not sum(received):
+                # Nothing worth resuming, don't leave a preallocated empty file behind.
+                os.remove(filename)
+                os.remove(state_file)
+
+            self.message_signal.emit(f"Couldn't download the file from {file_info['link']}." + NEW_LINE)
+            return False
+
+        os.remove(state_file)
+        checksum: Optional[str] = self._md5File(filename, total_size).hexdigest() if file_info["md5"] else None
+
+        return self._finishDownload(file_info, checksum)
+
+    @staticmethod
+    def _loadSegments(state_file: str) -> Tuple[int, List[Tuple[int, int]], List[int]]:
+        bounds: List[Tuple[int, int]] = []
+        received: List[int] = []
+
+        with open(state_file) as handler:
+            total_size: int = int(handler.readline())
+
+            for line in handler:
+                start, end, done = (int(value) for value in line.split())
+                bounds.append((start, end))
+                received.append(done)
+
+        return total_size, bounds, received
+
+    @staticmethod
+    def _saveSegments(state_file: str, total_size: int, bounds: List[Tuple[int, int]], received: List[int]) -> None:
+        lines: List[str] = [str(total_size)] + [f"{start} {end} {done}" for (start, end), done in zip(bounds, received)]
+
+        with open(state_file + '.tmp', 'w') as handler:
+            handler.write("\n".join(lines) + "\n")
+
+        os.replace(state_file + '.tmp', state_file)
+
+    def _finishDownload(self, file_info: Dict, checksum: Optional[str]) -> bool:
+        filename: str = file_info["path"] + '.part'
+
+        if file_info["md5"] and checksum != file_info["md5"]:
+            os.remove(filename)
+            self.message_signal.emit(f"{file_info['filename']} doesn't match its checksum, discarding it." + NEW_LINE)
+            return False
+
+        move(filename, file_info["path"])
+        self.update_signal.emit(file_info["filename"], 100.0, 0.0)
+        return True
+
+    @staticmethod
+    def _md5File(filename: str, length: int) -> Any:
+        digest: Any = md5(usedforsecurity=False)
+
+        if length == 0:
+            return digest
+
+        buffer: memoryview = memoryview(bytearray(1024 * 1024))
+
+        with open(filename, 'rb', buffering=0) as handler:
+            while length > 0:
+                read: int = handler.readinto(buffer[:min(length, len(buffer))])
+                if not read:
+                    break
+
+                digest.update(buffer[:read])
+                length -= read
+
+        return digest
+
+    def _downloadSegment(self, url: str, headers: Dict, fd: int, bounds: List[Tuple[int, int]],
+                         received: List[int], index: int, chunk_size: int) -> bool:
+        start, end = bounds[index]
+        offset: int = start + received[index]
+        segment_headers: Dict = dict(headers, Range=f"bytes={offset}-{end}")
+
+        try:
+            with self._session.get(url, headers=segment_headers, stream=True, timeout=(9, 27)) as response_handler:
+                if (response_handler.status_code != 206
+                        or response_handler.headers.get("Content-Encoding", "identity") != "identity"):
+                    return False
+
+                while offset <= end:
+                    chunk: bytes = response_handler.raw.read(min(chunk_size, end + 1 - offset), decode_content=False)
+                    if not chunk:
+                        break
+
+                    view: memoryview = memoryview(chunk)
+                    while view:
+                        written: int = os.pwrite(fd, view, offset)
+                        offset += written
+                        view = view[written:]
+
+                    received[index] = offset - start
+        except (RequestException, Urllib3Error):
+            return False
+
+        return offset == end + 1
+
+    @staticmethod
+    def _preallocate(fd: int, offset: int, length: int) -> None:
+        if not hasattr(os, "posix_fallocate"):
+            return
+
+        try:
+            os.posix_fallocate(fd, offset, length)
+        except OSError:
+            pass
+
+    def _cacheLink(self, filepath: str, filename: str, link: str, checksum: Optional[str] = None) -> None:
         self._files_link_list.append(
             {
                 "path": path.join(filepath, filename),
                 "filename": filename,
-                "link": link
+                "link": link,
+                "md5": checksum
             }
         )
 
-    def _parseLinks(self, _id: str, token: str, password: Optional[str] = None) -> None:
+    def _parseLinks(self, _id: str, token: str, parent_dir: str, password: Optional[str] = None) -> None:
+        with ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            parents: Dict[Future, str] = {executor.submit(self._fetchContent, _id, token, password): parent_dir}
+            pending = set(parents)
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    data: Dict = future.result()
+                    parent_dir = parents.pop(future)
+
+                    if data["type"] != "folder":
+                        self._cacheLink(parent_dir, data["name"], data["link"], data.get("md5"))
+                        continue
+
+                    folder_dir: str = path.join(parent_dir, data["name"])
+                    self._createDir(folder_dir)
+
+                    for child_id in data["childrenIds"]:
+                        child: Dict = data["children"][child_id]
+
+                        if child["type"] == "folder":
+                            child_future: Future = executor.submit(self._fetchContent, child["code"], token, password)
+                            parents[child_future] = folder_dir
+                            pending.add(child_future)
+                        else:
+                            self._cacheLink(folder_dir, child["name"], child["link"], child.get("md5"))
+
+    def _fetchContent(self, _id: str, token: str, password: Optional[str] = None) -> Dict:
         url: str = f"https://api.gofile.io/contents/{_id}?wt=4fd6sg89d7s6&cache=true"
 
         if password:
             url = url + f"&password={password}"
 
         headers: Dict = {
-            "User-Agent": getenv("GF_USERAGENT") if getenv("GF_USERAGENT") else "Mozilla/5.0",
-            "Accept-Encoding": "gzip, deflate, br",
-            "Accept": "*/*",
-            "Connection": "keep-alive",
             "Authorization": "Bearer" + " " + token,
         }
 
-        response: Dict = get(url, headers=headers).json()
+        response: Dict = self._session.get(url, headers=headers).json()
 
         if response["status"] != "ok":
             die(f"Failed to get a link as response from the {url}")
 
-        data: Dict = response["data"]
-
-        if data["type"] == "folder":
-            children_ids: List[str] = data["childrenIds"]
-
-            self._createDir(data["name"])
-            chdir(data["name"])
-
-            for child_id in children_ids:
-                child: Dict = data["children"][child_id]
-
-                if data["children"][child_id]["type"] == "folder":
-                    self._parseLinks(child["code"], token, password)
-                else:
-                    self._cacheLink(getcwd(), child["name"], child["link"])
-
-            chdir(path.pardir)
-        else:
-            self._cacheLink(getcwd(), data["name"], data["link"])
+        return response["data"]
 
 
 class DownloadApp(QWidget):
     def __init__(self) -> None:
         super().__init__()
 
+        self._max_workers: int = 8
+        self._session: Session = make_session(self._max_workers)
+        self._token: Optional[str] = None
+        self._token_lock: Lock = Lock()
+        self.download_thread: Optional[DownloadThread] = None
+
         self.initUI()
 
     def initUI(self) -> None:
@@ -291,19 +577,34 @@ class DownloadApp(QWidget):
 
     def start_download(self) -> None:
         url = self.url_input.text()
-        password = self.password_input.text()
+        password = self.password_input.text() or None
 
-        self.download_thread = DownloadThread(url, password, max_workers=3)
-        self.download_thread.progress_signal.connect(self.update_progress)
+        self.download_thread = DownloadThread(url, password, self._max_workers, self._accountToken, self._session)
+        self.download_thread.update_signal.connect(self.update_status)
         self.download_thread.message_signal.connect(self.update_message)
         self.download_thread.start()
 
-    def update_progress(self, progress: int) -> None:
-        self.progress_bar.setValue(progress)
+    def _accountToken(self) -> str:
+        # Called from the download threads, so the GUI never waits on the accounts API.
+        with self._token_lock:
+            if self._token is None:
+                self._token = Main._getToken(self._session)
+
+            return self._token
+
+    def update_status(self, filename: str, progress: float, rate: float) -> None:
+        self.progress_bar.setValue(int(progress))
+        self.message_label.setText(format_status(filename, progress, rate))
 
     def update_message(self, message: str) -> None:
         self.message_label.setText(message)
 
+    def closeEvent(self, event) -> None:
+        if self.download_thread is not None:
+            self.download_thread.wait()
+        self._session.close()
+        super().closeEvent(event)
+
 
 if __name__ == '__main__':
     import sys